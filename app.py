@@ -1,31 +1,123 @@
 from flask import Flask, render_template, jsonify, request, send_file, redirect, url_for, session, flash
+from flask.json.provider import JSONProvider
 from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime, timedelta
+from flask_caching import Cache
+from sqlalchemy import event, exc, func, insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import joinedload, object_session
+from datetime import date, datetime, timedelta
 import os
+import atexit
+import queue
+import threading
+import time
 import sqlite3
 import json
 import logging
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from werkzeug.utils import secure_filename
 import tempfile
-import pandas as pd
+import numpy as np
+import orjson
+import xlsxwriter
 from reportlab.lib.pagesizes import letter, A4
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib import colors
 from reportlab.lib.units import inch
+from xml.sax.saxutils import escape
 import io
+import copy
+import decimal
+import functools
+from collections import OrderedDict, defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
 import hashlib
 import secrets
+from cryptography.fernet import Fernet, MultiFernet
+from cachetools import TTLCache, cached
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
+class ORJSONProvider(JSONProvider):
+    """Flask JSON provider backed by orjson.
+    
+    orjson serializes datetime/date (ISO 8601, naive values marked UTC) and
+    NumPy scalars natively, so views can hand them to jsonify unconverted.
+    """
+    OPTIONS = orjson.OPT_NAIVE_UTC | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+    
+    @staticmethod
+    def _default(obj):
+        if isinstance(obj, decimal.Decimal):
+            return str(obj)
+        raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+    
+    def dumps(self, obj, **kwargs):
+        # Callers passing stdlib options (e.g. the session serializer's
+        # separators) get the stdlib encoder so the output matches exactly
+        if kwargs:
+            kwargs.setdefault('default', self._default)
+            return json.dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self._default, option=self.OPTIONS).decode()
+    
+    def loads(self, s, **kwargs):
+        # object_hook etc. are needed by TaggedJSONSerializer to restore
+        # session values; orjson supports none of them
+        if kwargs:
+            return json.loads(s, **kwargs)
+        return orjson.loads(s)
+    
+    def response(self, *args, **kwargs):
+        # Skip the bytes -> str -> bytes round trip of the default implementation
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=self._default, option=self.OPTIONS)
+        return self._app.response_class(body, mimetype='application/json')
+
 app = Flask(__name__)
+app.json = ORJSONProvider(app)
+
+def _load_or_create_secret():
+    """Return the persisted Flask secret key, generating it on first run.
+    
+    Keeping the key across restarts stops every restart from invalidating all
+    active sessions.
+    """
+    secret_path = os.path.join(app.instance_path, '.flask_secret')
+    try:
+        with open(secret_path) as f:
+            secret = f.read().strip()
+        if secret:
+            return secret
+        os.remove(secret_path)  # empty file left by an interrupted write
+    except FileNotFoundError:
+        pass
+    
+    os.makedirs(app.instance_path, exist_ok=True)
+    secret = secrets.token_bytes(32).hex()
+    fd, tmp_path = tempfile.mkstemp(dir=app.instance_path, prefix='.flask_secret.')  # created 0o600
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(secret)
+            f.flush()
+            os.fsync(f.fileno())
+        # link() never overwrites, so when several workers start together
+        # exactly one key wins and the others adopt it
+        os.link(tmp_path, secret_path)
+    except FileExistsError:
+        with open(secret_path) as f:
+            secret = f.read().strip()
+    finally:
+        os.remove(tmp_path)
+    return secret
+
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///balance_sheet_pro.db'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', secrets.token_hex(32))
+app.config['SECRET_KEY'] = os.getenv('SECRET_KEY') or _load_or_create_secret()
 
 # QuickBooks OAuth Configuration
 QBO_CLIENT_ID = os.getenv('QBO_CLIENT_ID')
@@ -33,6 +125,31 @@ QBO_CLIENT_SECRET = os.getenv('QBO_CLIENT_SECRET')
 QBO_REDIRECT_URI = os.getenv('QBO_REDIRECT_URI', 'http://localhost:5000/callback')
 QBO_ENVIRONMENT = os.getenv('QBO_ENVIRONMENT', 'sandbox')  # 'sandbox' or 'production'
 
+# PDF export styles are immutable configuration, so they are built once at import.
+# Fixed column widths also let reportlab skip its column width balancing pass.
+_PDF_STYLES = getSampleStyleSheet()
+_PDF_TITLE_STYLE = ParagraphStyle('CustomTitle', parent=_PDF_STYLES['Heading1'],
+                                  fontSize=18, spaceAfter=30, alignment=1)
+_CELL_STYLE = ParagraphStyle('cell', parent=_PDF_STYLES['Normal'], fontSize=8, leading=10)
+_BS_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black)
+])
+_ADJUSTMENT_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 8),
+    ('ALIGN', (1, 0), (2, -1), 'RIGHT'),
+    ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.black)
+])
+_ADJUSTMENT_COL_WIDTHS = [2*inch, 1*inch, 1*inch, 3*inch]  # fits A4 with 0.5in margins
+
 # Setup logging
 logging.basicConfig(
     level=logging.INFO,
@@ -44,13 +161,55 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+def _load_token_cipher():
+    """Build the token cipher from ENCRYPTION_KEY.
+    
+    The variable may hold several comma-separated Fernet keys, newest first, to
+    support key rotation: the first key encrypts, all of them can decrypt.
+    """
+    keys = [key.strip() for key in os.getenv('ENCRYPTION_KEY', '').split(',') if key.strip()]
+    if not keys:
+        logger.warning("ENCRYPTION_KEY is not set; QuickBooks tokens cannot be stored")
+        return None
+    return MultiFernet([Fernet(key) for key in keys])
+
+_token_cipher = _load_token_cipher()
+
+def _require_token_cipher():
+    if _token_cipher is None:
+        raise RuntimeError("ENCRYPTION_KEY must be configured to store QuickBooks tokens")
+    return _token_cipher
+
 db = SQLAlchemy(app)
+cache = Cache(app, config={'CACHE_TYPE': 'SimpleCache'})
+
+def _set_sqlite_pragma(dbapi_conn, connection_record):
+    """Tune every new SQLite connection for concurrent reads and cheap commits"""
+    if not isinstance(dbapi_conn, sqlite3.Connection):
+        return
+    
+    cursor = dbapi_conn.cursor()
+    cursor.execute('PRAGMA auto_vacuum=INCREMENTAL')  # only takes effect on a new database
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.execute('PRAGMA wal_autocheckpoint=1000')  # pages
+    cursor.execute('PRAGMA temp_store=MEMORY')
+    cursor.execute('PRAGMA cache_size=-20000')  # ~20 MB page cache
+    cursor.execute('PRAGMA mmap_size=268435456')  # 256 MB
+    cursor.close()
+
+with app.app_context():
+    event.listen(db.engine, 'connect', _set_sqlite_pragma)
 
 # QuickBooks OAuth Setup (simplified without authlib)
 # Note: This is a placeholder for future OAuth implementation
 
 class Account(db.Model):
     __tablename__ = 'accounts'
+    __table_args__ = (
+        db.Index('ix_accounts_type_active', 'account_type', 'active'),
+        db.Index('ix_accounts_type_subcategory', 'account_type', 'subcategory'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     qbo_account_id = db.Column(db.String(50), unique=True)
@@ -63,11 +222,14 @@ class Account(db.Model):
     status = db.Column(db.String(20), default='reconciled')  # reconciled, pending, adjusted, open_item
     description = db.Column(db.Text)
     active = db.Column(db.Boolean, default=True)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=func.now(), server_default=func.now())
+    updated_at = db.Column(db.DateTime, default=func.now(), server_default=func.now(), onupdate=func.now())
 
 class ReconciliationNote(db.Model):
     __tablename__ = 'reconciliation_notes'
+    __table_args__ = (
+        db.Index('ix_notes_created', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
@@ -75,22 +237,67 @@ class ReconciliationNote(db.Model):
     amount = db.Column(db.Float, default=0.0)
     note_type = db.Column(db.String(20), default='adjustment')  # adjustment, open_item, info
     status = db.Column(db.String(20), default='pending')  # pending, resolved, reviewed
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=func.now(), server_default=func.now())
+    updated_at = db.Column(db.DateTime, default=func.now(), server_default=func.now(), onupdate=func.now())
 
 class BalanceSheetSnapshot(db.Model):
     __tablename__ = 'balance_sheet_snapshots'
+    __table_args__ = (
+        db.Index('ix_snapshots_created', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     period = db.Column(db.String(50), nullable=False)  # e.g., "Q1 2025"
     date = db.Column(db.Date, nullable=False)
+    current_assets = db.Column(db.Float, default=0.0)
+    non_current_assets = db.Column(db.Float, default=0.0)
+    current_liabilities = db.Column(db.Float, default=0.0)
+    non_current_liabilities = db.Column(db.Float, default=0.0)
     total_assets = db.Column(db.Float, default=0.0)
     total_liabilities = db.Column(db.Float, default=0.0)
     total_equity = db.Column(db.Float, default=0.0)
     is_balanced = db.Column(db.Boolean, default=False)
     adjustments_count = db.Column(db.Integer, default=0)
     status = db.Column(db.String(20), default='completed')  # completed, failed, partial
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=func.now(), server_default=func.now())
+    
+    adjustments = db.relationship('Adjustment', back_populates='snapshot', lazy='selectin',
+                                  order_by='Adjustment.id')
+
+class SnapshotSummary(db.Model):
+    """Single-row rollup of balance_sheet_snapshots, kept current by the reconciler"""
+    __tablename__ = 'snapshot_summary'
+    
+    id = db.Column(db.Integer, primary_key=True)  # always 1
+    snapshot_count = db.Column(db.Integer, default=0)
+    last_snapshot_id = db.Column(db.Integer, db.ForeignKey('balance_sheet_snapshots.id'))
+    last_date = db.Column(db.Date)
+    last_total_assets = db.Column(db.Float, default=0.0)
+    last_total_liabilities = db.Column(db.Float, default=0.0)
+    last_total_equity = db.Column(db.Float, default=0.0)
+    last_is_balanced = db.Column(db.Boolean, default=False)
+    updated_at = db.Column(db.DateTime, default=func.now(), server_default=func.now(), onupdate=func.now())
+    
+    @staticmethod
+    def record(snapshot):
+        """Fold a newly added snapshot into the summary row (caller commits).
+        
+        A single upsert, so concurrent reconciles neither lose an increment nor
+        race to insert the row.
+        """
+        latest = {
+            'last_snapshot_id': snapshot.id,
+            'last_date': snapshot.date,
+            'last_total_assets': snapshot.total_assets,
+            'last_total_liabilities': snapshot.total_liabilities,
+            'last_total_equity': snapshot.total_equity,
+            'last_is_balanced': snapshot.is_balanced
+        }
+        statement = sqlite_insert(SnapshotSummary).values(id=1, snapshot_count=1, **latest)
+        db.session.execute(statement.on_conflict_do_update(
+            index_elements=['id'],
+            set_=dict(latest, snapshot_count=SnapshotSummary.snapshot_count + 1, updated_at=func.now())
+        ))
 
 class QBOConnection(db.Model):
     __tablename__ = 'qbo_connections'
@@ -101,24 +308,61 @@ class QBOConnection(db.Model):
     refresh_token = db.Column(db.Text, nullable=False)
     expires_at = db.Column(db.DateTime, nullable=False)
     company_name = db.Column(db.String(200))
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=func.now(), server_default=func.now())
+    updated_at = db.Column(db.DateTime, default=func.now(), server_default=func.now(), onupdate=func.now())
     
     def set_tokens(self, access_token, refresh_token):
-        """Store tokens (plaintext for now)"""
-        self.access_token = access_token
-        self.refresh_token = refresh_token
+        """Store tokens encrypted at rest"""
+        cipher = _require_token_cipher()
+        self.access_token = cipher.encrypt(access_token.encode()).decode()
+        self.refresh_token = cipher.encrypt(refresh_token.encode()).decode()
+        # The cached row is dropped once the new tokens are committed; dropping
+        # it now would let a concurrent get_connection re-cache the old ones
+        db_session = object_session(self) or db.session
+        db_session.info.setdefault('stale_connections', set()).add(self.realm_id)
     
     def get_access_token(self):
-        """Return access token"""
-        return self.access_token
+        """Return decrypted access token"""
+        return _require_token_cipher().decrypt(self.access_token.encode()).decode()
     
     def get_refresh_token(self):
-        """Return refresh token"""
-        return self.refresh_token
+        """Return decrypted refresh token"""
+        return _require_token_cipher().decrypt(self.refresh_token.encode()).decode()
+    
+    def rotate_tokens(self):
+        """Re-encrypt stored tokens with the current primary ENCRYPTION_KEY"""
+        cipher = _require_token_cipher()
+        self.access_token = cipher.rotate(self.access_token.encode()).decode()
+        self.refresh_token = cipher.rotate(self.refresh_token.encode()).decode()
+
+@cache.memoize(timeout=3000)  # shorter than the 1 hour QuickBooks access token lifetime
+def get_connection(realm_id):
+    """Return the QBOConnection for a company, cached to skip a SELECT per API call.
+    
+    The cached instance is detached from the session; merge it back with
+    db.session.merge() before modifying it.
+    """
+    return QBOConnection.query.filter_by(realm_id=realm_id).first()
+
+def invalidate_connection(realm_id):
+    """Drop the cached QBOConnection for a company, e.g. after its tokens change"""
+    cache.delete_memoized(get_connection, realm_id)
+
+@event.listens_for(db.session, 'after_commit')
+def _invalidate_committed_connections(db_session):
+    """Drop cached QBOConnections whose tokens this commit changed"""
+    for realm_id in db_session.info.pop('stale_connections', ()):
+        invalidate_connection(realm_id)
+
+@event.listens_for(db.session, 'after_rollback')
+def _forget_stale_connections(db_session):
+    db_session.info.pop('stale_connections', None)
 
 class Adjustment(db.Model):
     __tablename__ = 'adjustments'
+    __table_args__ = (
+        db.Index('ix_adjustments_recon_log', 'reconciliation_log_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     reconciliation_log_id = db.Column(db.Integer, db.ForeignKey('balance_sheet_snapshots.id'))
@@ -128,10 +372,22 @@ class Adjustment(db.Model):
     adjustment_amount = db.Column(db.Float, default=0.0)
     reason = db.Column(db.Text, nullable=False)
     adjustment_type = db.Column(db.String(50), nullable=False)  # correction, reclassification, write_off
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=func.now(), server_default=func.now())
+    
+    snapshot = db.relationship('BalanceSheetSnapshot', back_populates='adjustments')
+
+class TableVersion(db.Model):
+    """Per-table change counter, bumped by SQLite triggers in the writing transaction"""
+    __tablename__ = 'table_versions'
+    
+    table_name = db.Column(db.String(100), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
 
 class AuditLog(db.Model):
     __tablename__ = 'audit_logs'
+    __table_args__ = (
+        db.Index('ix_audit_realm_created', 'realm_id', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     action = db.Column(db.String(100), nullable=False)
@@ -139,201 +395,288 @@ class AuditLog(db.Model):
     ip_address = db.Column(db.String(45))
     user_agent = db.Column(db.String(500))
     realm_id = db.Column(db.String(50))  # QuickBooks company ID
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=func.now(), server_default=func.now())
     
     @staticmethod
     def log_action(action, details=None, realm_id=None):
-        """Log an action with request context"""
+        """Log an action with request context (written to the database in the background)"""
         from flask import request
         
-        log_entry = AuditLog(
-            action=action,
-            details=details,
-            ip_address=request.remote_addr if request else None,
-            user_agent=request.headers.get('User-Agent') if request else None,
-            realm_id=realm_id
-        )
+        log_entry = {
+            'action': action,
+            'details': details,
+            'ip_address': request.remote_addr if request else None,
+            'user_agent': request.headers.get('User-Agent') if request else None,
+            'realm_id': realm_id,
+            'created_at': datetime.utcnow()
+        }
         
-        db.session.add(log_entry)
-        db.session.commit()
+        try:
+            _audit_queue.put_nowait(log_entry)
+        except queue.Full:
+            # Writer is falling behind; don't drop audit records
+            _store_audit_batch([log_entry])
         
         # Also log to file logger
-        logger.info(f"AUDIT: {action} - {details or ''} - IP: {log_entry.ip_address} - Realm: {realm_id or 'N/A'}")
+        logger.info(f"AUDIT: {action} - {details or ''} - IP: {log_entry['ip_address']} - Realm: {realm_id or 'N/A'}")
 
-def generate_demo_balance_sheet_data(as_of_date=None):
-    """Generate impressive demo balance sheet data"""
-    import random
-    
-    # Demo company info
-    company_name = "TechCorp Industries Inc."
-    
-    # Generate realistic account balances
-    demo_data = {
-        'company_name': company_name,
-        'as_of_date': as_of_date or datetime.now().date(),
-        'accounts': {
-            'assets': {
-                'current': [
-                    {
-                        'id': 1,
-                        'name': 'Cash & Cash Equivalents',
-                        'balance': 2847500,
-                        'status': 'reconciled',
-                        'description': 'Operating cash and short-term investments'
-                    },
-                    {
-                        'id': 2,
-                        'name': 'Accounts Receivable',
-                        'balance': 1876500,
-                        'status': 'reconciled',
-                        'description': 'Trade receivables from customers'
-                    },
-                    {
-                        'id': 3,
-                        'name': 'Inventory',
-                        'balance': 3420000,
-                        'status': 'adjusted',
-                        'description': 'Raw materials and finished goods'
-                    },
-                    {
-                        'id': 4,
-                        'name': 'Prepaid Expenses',
-                        'balance': 485000,
-                        'status': 'reconciled',
-                        'description': 'Insurance and rent prepayments'
-                    },
-                    {
-                        'id': 5,
-                        'name': 'Short-term Investments',
-                        'balance': 1250000,
-                        'status': 'reconciled',
-                        'description': 'Marketable securities and T-bills'
-                    }
-                ],
-                'non_current': [
-                    {
-                        'id': 6,
-                        'name': 'Property & Equipment (net)',
-                        'balance': 15680000,
-                        'status': 'reconciled',
-                        'description': 'Buildings, machinery, and equipment'
-                    },
-                    {
-                        'id': 7,
-                        'name': 'Intangible Assets',
-                        'balance': 3200000,
-                        'status': 'pending',
-                        'description': 'Patents, trademarks, and software'
-                    },
-                    {
-                        'id': 8,
-                        'name': 'Long-term Investments',
-                        'balance': 2100000,
-                        'status': 'reconciled',
-                        'description': 'Strategic investments and joint ventures'
-                    }
-                ]
-            },
-            'liabilities': {
-                'current': [
-                    {
-                        'id': 9,
-                        'name': 'Accounts Payable',
-                        'balance': 2340000,
-                        'status': 'reconciled',
-                        'description': 'Trade payables to suppliers'
-                    },
-                    {
-                        'id': 10,
-                        'name': 'Accrued Liabilities',
-                        'balance': 875000,
-                        'status': 'reconciled',
-                        'description': 'Wages, taxes, and other accruals'
-                    },
-                    {
-                        'id': 11,
-                        'name': 'Short-term Debt',
-                        'balance': 1500000,
-                        'status': 'open_item',
-                        'description': 'Bank lines and commercial paper'
-                    },
-                    {
-                        'id': 12,
-                        'name': 'Current Portion of Long-term Debt',
-                        'balance': 650000,
-                        'status': 'reconciled',
-                        'description': 'Principal due within 12 months'
-                    }
-                ],
-                'non_current': [
-                    {
-                        'id': 13,
-                        'name': 'Long-term Debt',
-                        'balance': 8900000,
-                        'status': 'reconciled',
-                        'description': 'Bonds and term loans'
-                    },
-                    {
-                        'id': 14,
-                        'name': 'Deferred Tax Liabilities',
-                        'balance': 1420000,
-                        'status': 'pending',
-                        'description': 'Tax deferrals and timing differences'
-                    },
-                    {
-                        'id': 15,
-                        'name': 'Pension Obligations',
-                        'balance': 2100000,
-                        'status': 'reconciled',
-                        'description': 'Retirement benefit obligations'
-                    }
-                ]
-            },
-            'equity': [
+# Audit entries are buffered and written in batches by a background thread,
+# keeping the INSERT + commit out of the request path
+AUDIT_BATCH_SIZE = 100
+AUDIT_FLUSH_INTERVAL = 0.5  # seconds
+AUDIT_WRITE_ATTEMPTS = 3
+AUDIT_SHUTDOWN_TIMEOUT = 10  # seconds to wait for the writer at exit
+_audit_queue = queue.Queue(maxsize=10_000)
+_AUDIT_STOP = object()  # queued at exit to make the writer finish its batch and return
+
+def _write_audit_batch(batch):
+    """Insert a batch of audit entries with a single executemany"""
+    with app.app_context():
+        db.session.execute(insert(AuditLog), batch)
+        db.session.commit()
+
+def _store_audit_batch(batch):
+    """Write a batch, retrying transient failures such as a locked database.
+    
+    Entries that still cannot be written are logged in full rather than lost.
+    """
+    for attempt in range(1, AUDIT_WRITE_ATTEMPTS + 1):
+        try:
+            _write_audit_batch(batch)
+            return
+        except Exception as e:
+            logger.warning(f"Error writing {len(batch)} audit log entries (attempt {attempt}): {e}")
+            if attempt < AUDIT_WRITE_ATTEMPTS:
+                time.sleep(AUDIT_FLUSH_INTERVAL * attempt)
+    
+    for entry in batch:
+        logger.error(f"AUDIT NOT STORED: {entry}")
+
+def _audit_writer():
+    """Drain the audit queue, flushing every AUDIT_BATCH_SIZE rows or AUDIT_FLUSH_INTERVAL seconds"""
+    stopping = False
+    while not stopping:
+        entry = _audit_queue.get()
+        if entry is _AUDIT_STOP:
+            break
+        
+        batch = [entry]
+        deadline = time.monotonic() + AUDIT_FLUSH_INTERVAL
+        while len(batch) < AUDIT_BATCH_SIZE:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                entry = _audit_queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if entry is _AUDIT_STOP:
+                stopping = True
+                break
+            batch.append(entry)
+        
+        _store_audit_batch(batch)
+
+def flush_audit_log():
+    """Synchronously write any audit entries still waiting in the queue"""
+    batch = []
+    while True:
+        try:
+            entry = _audit_queue.get_nowait()
+        except queue.Empty:
+            break
+        if entry is not _AUDIT_STOP:
+            batch.append(entry)
+    
+    if batch:
+        _store_audit_batch(batch)
+
+def _shutdown_audit_writer():
+    """Let the writer finish the batch it holds, then write whatever is still queued"""
+    if _audit_thread.is_alive():
+        try:
+            _audit_queue.put(_AUDIT_STOP, timeout=AUDIT_SHUTDOWN_TIMEOUT)
+            _audit_thread.join(AUDIT_SHUTDOWN_TIMEOUT)
+        except queue.Full:
+            pass
+    flush_audit_log()
+
+_audit_thread = threading.Thread(target=_audit_writer, name='audit-log-writer', daemon=True)
+_audit_thread.start()
+atexit.register(_shutdown_audit_writer)
+
+# Demo company with realistic account balances; the data is static, so the
+# structure and its totals are built once at import time
+_DEMO_SHEET_TEMPLATE = {
+    'company_name': "TechCorp Industries Inc.",
+    'accounts': {
+        'assets': {
+            'current': [
                 {
-                    'id': 16,
-                    'name': 'Common Stock',
-                    'balance': 5000000,
+                    'id': 1,
+                    'name': 'Cash & Cash Equivalents',
+                    'balance': 2847500,
                     'status': 'reconciled',
-                    'description': 'Issued and outstanding shares'
+                    'description': 'Operating cash and short-term investments'
                 },
                 {
-                    'id': 17,
-                    'name': 'Additional Paid-in Capital',
-                    'balance': 12000000,
+                    'id': 2,
+                    'name': 'Accounts Receivable',
+                    'balance': 1876500,
                     'status': 'reconciled',
-                    'description': 'Premium over par value'
+                    'description': 'Trade receivables from customers'
                 },
                 {
-                    'id': 18,
-                    'name': 'Retained Earnings',
-                    'balance': 8450000,
+                    'id': 3,
+                    'name': 'Inventory',
+                    'balance': 3420000,
                     'status': 'adjusted',
-                    'description': 'Cumulative net income retained'
+                    'description': 'Raw materials and finished goods'
+                },
+                {
+                    'id': 4,
+                    'name': 'Prepaid Expenses',
+                    'balance': 485000,
+                    'status': 'reconciled',
+                    'description': 'Insurance and rent prepayments'
                 },
                 {
-                    'id': 19,
-                    'name': 'Current Period Net Income',
-                    'balance': 2875000,
+                    'id': 5,
+                    'name': 'Short-term Investments',
+                    'balance': 1250000,
                     'status': 'reconciled',
-                    'description': 'Net income for current fiscal year'
+                    'description': 'Marketable securities and T-bills'
                 }
-                ]
-        }
+            ],
+            'non_current': [
+                {
+                    'id': 6,
+                    'name': 'Property & Equipment (net)',
+                    'balance': 15680000,
+                    'status': 'reconciled',
+                    'description': 'Buildings, machinery, and equipment'
+                },
+                {
+                    'id': 7,
+                    'name': 'Intangible Assets',
+                    'balance': 3200000,
+                    'status': 'pending',
+                    'description': 'Patents, trademarks, and software'
+                },
+                {
+                    'id': 8,
+                    'name': 'Long-term Investments',
+                    'balance': 2100000,
+                    'status': 'reconciled',
+                    'description': 'Strategic investments and joint ventures'
+                }
+            ]
+        },
+        'liabilities': {
+            'current': [
+                {
+                    'id': 9,
+                    'name': 'Accounts Payable',
+                    'balance': 2340000,
+                    'status': 'reconciled',
+                    'description': 'Trade payables to suppliers'
+                },
+                {
+                    'id': 10,
+                    'name': 'Accrued Liabilities',
+                    'balance': 875000,
+                    'status': 'reconciled',
+                    'description': 'Wages, taxes, and other accruals'
+                },
+                {
+                    'id': 11,
+                    'name': 'Short-term Debt',
+                    'balance': 1500000,
+                    'status': 'open_item',
+                    'description': 'Bank lines and commercial paper'
+                },
+                {
+                    'id': 12,
+                    'name': 'Current Portion of Long-term Debt',
+                    'balance': 650000,
+                    'status': 'reconciled',
+                    'description': 'Principal due within 12 months'
+                }
+            ],
+            'non_current': [
+                {
+                    'id': 13,
+                    'name': 'Long-term Debt',
+                    'balance': 8900000,
+                    'status': 'reconciled',
+                    'description': 'Bonds and term loans'
+                },
+                {
+                    'id': 14,
+                    'name': 'Deferred Tax Liabilities',
+                    'balance': 1420000,
+                    'status': 'pending',
+                    'description': 'Tax deferrals and timing differences'
+                },
+                {
+                    'id': 15,
+                    'name': 'Pension Obligations',
+                    'balance': 2100000,
+                    'status': 'reconciled',
+                    'description': 'Retirement benefit obligations'
+                }
+            ]
+        },
+        'equity': [
+            {
+                'id': 16,
+                'name': 'Common Stock',
+                'balance': 5000000,
+                'status': 'reconciled',
+                'description': 'Issued and outstanding shares'
+            },
+            {
+                'id': 17,
+                'name': 'Additional Paid-in Capital',
+                'balance': 12000000,
+                'status': 'reconciled',
+                'description': 'Premium over par value'
+            },
+            {
+                'id': 18,
+                'name': 'Retained Earnings',
+                'balance': 8450000,
+                'status': 'adjusted',
+                'description': 'Cumulative net income retained'
+            },
+            {
+                'id': 19,
+                'name': 'Current Period Net Income',
+                'balance': 2875000,
+                'status': 'reconciled',
+                'description': 'Net income for current fiscal year'
+            }
+        ]
     }
-    
-    # Calculate totals
-    current_assets = sum(acc['balance'] for acc in demo_data['accounts']['assets']['current'])
-    non_current_assets = sum(acc['balance'] for acc in demo_data['accounts']['assets']['non_current'])
+}
+
+def _sum_balances(accounts):
+    """Sum the 'balance' field of a list of account dicts as one float64 reduction"""
+    return float(np.fromiter((acc['balance'] for acc in accounts), dtype=np.float64, count=len(accounts)).sum())
+
+def _demo_sheet_totals(accounts):
+    """Calculate balance sheet totals for the demo accounts"""
+    current_assets = _sum_balances(accounts['assets']['current'])
+    non_current_assets = _sum_balances(accounts['assets']['non_current'])
     total_assets = current_assets + non_current_assets
     
-    current_liabilities = sum(liab['balance'] for liab in demo_data['accounts']['liabilities']['current'])
-    non_current_liabilities = sum(liab['balance'] for liab in demo_data['accounts']['liabilities']['non_current'])
+    current_liabilities = _sum_balances(accounts['liabilities']['current'])
+    non_current_liabilities = _sum_balances(accounts['liabilities']['non_current'])
     total_liabilities = current_liabilities + non_current_liabilities
     
-    total_equity = sum(eq['balance'] for eq in demo_data['accounts']['equity'])
+    total_equity = _sum_balances(accounts['equity'])
     
-    demo_data['totals'] = {
+    return {
         'current_assets': current_assets,
         'non_current_assets': non_current_assets,
         'total_assets': total_assets,
@@ -342,7 +685,13 @@ def generate_demo_balance_sheet_data(as_of_date=None):
         'total_liabilities': total_liabilities,
         'total_equity': total_equity
     }
-    
+
+_DEMO_SHEET_TEMPLATE['totals'] = _demo_sheet_totals(_DEMO_SHEET_TEMPLATE['accounts'])
+
+def generate_demo_balance_sheet_data(as_of_date=None):
+    """Generate impressive demo balance sheet data"""
+    demo_data = copy.copy(_DEMO_SHEET_TEMPLATE)
+    demo_data['as_of_date'] = as_of_date or datetime.now().date()
     return demo_data
 
 def generate_demo_adjustments():
@@ -397,6 +746,13 @@ def generate_demo_reconciliation_checks():
     }
 
 class QuickBooksAPI:
+    TIMEOUT = (3, 30)  # (connect, read) seconds
+    
+    _Q_OPEN_AR = 'SELECT * FROM Customer WHERE Balance > 0'
+    _Q_OPEN_AP = 'SELECT * FROM Vendor WHERE Balance > 0'
+    _Q_COA = 'SELECT * FROM Account WHERE Active = true'
+    _Q_BANK = "SELECT * FROM Account WHERE AccountType = 'Bank'"
+    
     def __init__(self, realm_id, access_token):
         self.realm_id = realm_id
         self.access_token = access_token
@@ -406,6 +762,32 @@ class QuickBooksAPI:
             'Accept': 'application/json',
             'Content-Type': 'application/json'
         }
+        
+        # Endpoint URLs are fixed per company, so build them once
+        self.url_company_info = f'{self.base_url}/companyinfo/{realm_id}'
+        self.url_tb = f'{self.base_url}/reports/TrialBalance'
+        self.url_bs = f'{self.base_url}/reports/BalanceSheet'
+        self.url_query = f'{self.base_url}/query'
+        
+        # Pooled keep-alive session so successive report calls reuse one TLS connection
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = HTTPAdapter(
+            pool_connections=20,
+            pool_maxsize=50,
+            max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504])
+        )
+        self.session.mount('https://', adapter)
+    
+    def _get(self, url, params=None, description='data'):
+        """GET a QuickBooks endpoint and decode the JSON body, returning None on failure"""
+        try:
+            response = self.session.get(url, params=params, timeout=self.TIMEOUT)
+            response.raise_for_status()
+            return orjson.loads(response.content)
+        except (requests.exceptions.RequestException, orjson.JSONDecodeError) as e:
+            logger.error(f"Error getting {description}: {e}")
+            return None
     
     def refresh_access_token(self, refresh_token):
         """Refresh access token using refresh token (placeholder)"""
@@ -415,77 +797,66 @@ class QuickBooksAPI:
     
     def get_company_info(self):
         """Get company information"""
-        try:
-            response = requests.get(f'{self.base_url}/companyinfo/{self.realm_id}', headers=self.headers)
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Error getting company info: {e}")
-            return None
+        return self._get(self.url_company_info, description='company info')
     
     def get_trial_balance(self, as_of_date=None):
         """Get trial balance"""
-        try:
-            params = {}
-            if as_of_date:
-                params['asofdate'] = as_of_date.isoformat()
-            
-            response = requests.get(f'{self.base_url}/reports/TrialBalance', headers=self.headers, params=params)
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Error getting trial balance: {e}")
-            return None
+        params = {'asofdate': as_of_date.isoformat()} if as_of_date else None
+        return self._get(self.url_tb, params, 'trial balance')
     
     def get_balance_sheet_report(self, as_of_date=None):
         """Get balance sheet report from QuickBooks"""
-        try:
-            params = {}
-            if as_of_date:
-                params['as_of_date'] = as_of_date.isoformat()
-            
-            response = requests.get(f'{self.base_url}/reports/BalanceSheet', headers=self.headers, params=params)
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Error getting balance sheet report: {e}")
-            return None
+        params = {'as_of_date': as_of_date.isoformat()} if as_of_date else None
+        return self._get(self.url_bs, params, 'balance sheet report')
     
     def get_open_ar(self):
         """Get open accounts receivable"""
-        try:
-            response = requests.get(f'{self.base_url}/query', headers=self.headers, params={
-                'query': 'SELECT * FROM Customer WHERE Balance > 0'
-            })
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Error getting open A/R: {e}")
-            return None
+        return self._get(self.url_query, {'query': self._Q_OPEN_AR}, 'open A/R')
     
     def get_open_ap(self):
         """Get open accounts payable"""
-        try:
-            response = requests.get(f'{self.base_url}/query', headers=self.headers, params={
-                'query': 'SELECT * FROM Vendor WHERE Balance > 0'
-            })
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Error getting open A/P: {e}")
-            return None
+        return self._get(self.url_query, {'query': self._Q_OPEN_AP}, 'open A/P')
     
     def get_chart_of_accounts(self):
         """Get chart of accounts"""
-        try:
-            response = requests.get(f'{self.base_url}/query', headers=self.headers, params={
-                'query': 'SELECT * FROM Account WHERE Active = true'
-            })
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Error getting chart of accounts: {e}")
-            return None
+        return self._get(self.url_query, {'query': self._Q_COA}, 'chart of accounts')
+    
+    def get_bank_accounts(self):
+        """Get bank accounts with their ledger balances"""
+        return self._get(self.url_query, {'query': self._Q_BANK}, 'bank accounts')
+
+# Account types whose balance should never be negative
+_NO_NEGATIVE_TYPES = frozenset({'Accounts Receivable', 'Cash', 'Inventory'})
+
+# Summaries of recently seen balance sheet payloads; identical QuickBooks
+# reports produce identical summaries, so they are keyed by a payload digest
+SUMMARY_CACHE_SIZE = 32
+_summary_cache = OrderedDict()
+_summary_cache_lock = threading.Lock()
+
+def _payload_digest(payload):
+    """Stable 128-bit digest of a JSON payload, hashed once instead of comparing nested dicts"""
+    return hashlib.blake2b(orjson.dumps(payload, option=orjson.OPT_SORT_KEYS), digest_size=16).digest()
+
+# Summary balance sheet classification: (section keyword, summary section,
+# [(subsection keywords, bucket), ...], fallback bucket), checked in order
+_SUMMARY_CATEGORY_RULES = (
+    ('ASSET', 'assets', ((('CURRENT',), 'current'), (('FIXED', 'PROPERTY'), 'fixed')), 'other'),
+    ('LIABILITY', 'liabilities', ((('CURRENT',), 'current'),), 'long_term'),
+    ('EQUITY', 'equity', ((('RETAINED',), 'retained_earnings'),), 'owners_equity'),
+)
+
+@functools.lru_cache(maxsize=512)
+def _classify_summary_section(section_name):
+    """Return the (section, bucket) a report group belongs to, or None if uncategorized"""
+    name = section_name.upper()
+    for keyword, section, sub_rules, fallback in _SUMMARY_CATEGORY_RULES:
+        if keyword in name:
+            for sub_keywords, bucket in sub_rules:
+                if any(sub_keyword in name for sub_keyword in sub_keywords):
+                    return section, bucket
+            return section, fallback
+    return None
 
 class BalanceSheetReconciler:
     def __init__(self, qbo_api):
@@ -497,24 +868,33 @@ class BalanceSheetReconciler:
         """Perform full reconciliation process"""
         logger.info(f"Starting reconciliation for date: {as_of_date}")
         
-        # Get data from QuickBooks
-        trial_balance = self.qbo_api.get_trial_balance(as_of_date)
-        balance_sheet = self.qbo_api.get_balance_sheet_report(as_of_date)
-        chart_of_accounts = self.qbo_api.get_chart_of_accounts()
-        open_ar = self.qbo_api.get_open_ar()
-        open_ap = self.qbo_api.get_open_ap()
-        bank_accounts = self.qbo_api.get_bank_accounts()
+        # Get data from QuickBooks; the reports are independent so fetch them concurrently
+        with ThreadPoolExecutor(max_workers=6) as executor:
+            trial_balance_future = executor.submit(self.qbo_api.get_trial_balance, as_of_date)
+            balance_sheet_future = executor.submit(self.qbo_api.get_balance_sheet_report, as_of_date)
+            chart_of_accounts_future = executor.submit(self.qbo_api.get_chart_of_accounts)
+            open_ar_future = executor.submit(self.qbo_api.get_open_ar)
+            open_ap_future = executor.submit(self.qbo_api.get_open_ap)
+            bank_accounts_future = executor.submit(self.qbo_api.get_bank_accounts)
+            
+            trial_balance = trial_balance_future.result()
+            balance_sheet = balance_sheet_future.result()
+            chart_of_accounts = chart_of_accounts_future.result()
+            open_ar = open_ar_future.result()
+            open_ap = open_ap_future.result()
+            bank_accounts = bank_accounts_future.result()
         
         if not all([trial_balance, balance_sheet, chart_of_accounts]):
             raise Exception("Failed to retrieve required data from QuickBooks")
         
         # Perform comprehensive reconciliation checks
         self._validate_trial_balance(trial_balance)
-        self._verify_balance_sheet_totals(balance_sheet)
+        bs_totals = self._extract_bs_totals(balance_sheet)
+        self._verify_balance_sheet_totals(bs_totals)
         self._check_account_balances(chart_of_accounts, trial_balance)
         self._reconcile_bank_accounts(bank_accounts, trial_balance)
         self._verify_open_items(open_ar, open_ap)
-        self._validate_retained_earnings(balance_sheet, trial_balance)
+        self._validate_retained_earnings(bs_totals, trial_balance)
         
         # Generate summary balance sheet
         summary_bs = self._generate_summary_balance_sheet(balance_sheet)
@@ -523,6 +903,10 @@ class BalanceSheetReconciler:
         reconciliation_log = BalanceSheetSnapshot(
             date=as_of_date or datetime.now().date(),
             period=f"{as_of_date or datetime.now().date()}",
+            current_assets=summary_bs['assets']['current'],
+            non_current_assets=summary_bs['assets']['fixed'] + summary_bs['assets']['other'],
+            current_liabilities=summary_bs['liabilities']['current'],
+            non_current_liabilities=summary_bs['liabilities']['long_term'],
             total_assets=summary_bs['total_assets'],
             total_liabilities=summary_bs['total_liabilities'],
             total_equity=summary_bs['total_equity'],
@@ -531,24 +915,22 @@ class BalanceSheetReconciler:
             status='completed'
         )
         
+        # Snapshot, summary row and adjustments commit together, so a snapshot id
+        # never becomes visible to another worker without its adjustments
         db.session.add(reconciliation_log)
-        db.session.commit()
-        
-        # Save adjustments
-        for adj in self.adjustments:
-            adjustment = Adjustment(
-                reconciliation_log_id=reconciliation_log.id,
-                account_name=adj['account_name'],
-                original_amount=adj['original_amount'],
-                adjusted_amount=adj['adjusted_amount'],
-                adjustment_amount=adj['adjustment_amount'],
-                reason=adj['reason'],
-                adjustment_type=adj['adjustment_type']
-            )
-            db.session.add(adjustment)
+        db.session.flush()
+        SnapshotSummary.record(reconciliation_log)
         
+        # Save adjustments in a single batched INSERT
+        db.session.bulk_save_objects([
+            Adjustment(reconciliation_log_id=reconciliation_log.id, **adj)
+            for adj in self.adjustments
+        ])
+
         db.session.commit()
         
+        invalidate_export_cache()
+        
         logger.info(f"Reconciliation completed. {len(self.adjustments)} adjustments made.")
         
         return {
@@ -563,8 +945,8 @@ class BalanceSheetReconciler:
         if 'Rows' not in trial_balance:
             return
         
-        total_debits = 0
-        total_credits = 0
+        total_debits = 0.0
+        total_credits = 0.0
         
         for row in trial_balance['Rows']:
             if 'ColData' in row:
@@ -589,30 +971,40 @@ class BalanceSheetReconciler:
             }
             self.adjustments.append(adjustment)
     
-    def _verify_balance_sheet_totals(self, balance_sheet):
-        """Verify balance sheet equation: Assets = Liabilities + Equity"""
+    def _extract_bs_totals(self, balance_sheet):
+        """Walk the balance sheet report once and pull out the section totals"""
         if 'Rows' not in balance_sheet:
-            return
+            return None
         
-        total_assets = 0
-        total_liabilities = 0
-        total_equity = 0
+        totals = {'assets': 0, 'liabilities': 0, 'equity': 0, 'retained_earnings': 0}
+        retained_found = False
         
         for row in balance_sheet['Rows']:
             if 'Rows' in row:  # Main sections
                 for sub_row in row['Rows']:
                     if 'ColData' in sub_row and len(sub_row['ColData']) > 1:
-                        section_name = sub_row.get('group', '')
+                        section_name = sub_row.get('group', '').upper()
                         total_value = float(sub_row['ColData'][-1].get('value', 0))
                         
-                        if 'ASSET' in section_name.upper():
-                            total_assets = total_value
-                        elif 'LIABILITY' in section_name.upper():
-                            total_liabilities = total_value
-                        elif 'EQUITY' in section_name.upper():
-                            total_equity = total_value
-        
-        difference = abs(total_assets - (total_liabilities + total_equity))
+                        if 'ASSET' in section_name:
+                            totals['assets'] = total_value
+                        elif 'LIABILITY' in section_name:
+                            totals['liabilities'] = total_value
+                        elif 'EQUITY' in section_name:
+                            totals['equity'] = total_value
+                        
+                        if not retained_found and 'RETAINED' in section_name:
+                            totals['retained_earnings'] = total_value
+                            retained_found = True
+        
+        return totals
+    
+    def _verify_balance_sheet_totals(self, bs_totals):
+        """Verify balance sheet equation: Assets = Liabilities + Equity"""
+        if bs_totals is None:
+            return
+        
+        difference = abs(bs_totals['assets'] - (bs_totals['liabilities'] + bs_totals['equity']))
         self.reconciliation_checks['balance_sheet_difference'] = difference
         
         if difference > 0.01:
@@ -675,20 +1067,12 @@ class BalanceSheetReconciler:
             }
             self.adjustments.append(adjustment)
     
-    def _validate_retained_earnings(self, balance_sheet, trial_balance):
+    def _validate_retained_earnings(self, bs_totals, trial_balance):
         """Verify retained earnings calculation"""
-        if 'Rows' not in balance_sheet:
+        if bs_totals is None:
             return
         
-        retained_earnings = 0
-        for row in balance_sheet['Rows']:
-            if 'Rows' in row:
-                for sub_row in row['Rows']:
-                    if 'ColData' in sub_row and len(sub_row['ColData']) > 1:
-                        section_name = sub_row.get('group', '')
-                        if 'RETAINED' in section_name.upper():
-                            retained_earnings = float(sub_row['ColData'][-1].get('value', 0))
-                            break
+        retained_earnings = bs_totals['retained_earnings']
         
         # Flag negative retained earnings
         if retained_earnings < 0:
@@ -708,14 +1092,13 @@ class BalanceSheetReconciler:
             return
         
         for account in chart_of_accounts['QueryResponse'].get('Account', []):
-            account_name = account.get('Name', '')
             account_type = account.get('AccountType', '')
             current_balance = account.get('CurrentBalance', 0)
             
             # Check for negative balances in accounts that shouldn't be negative
-            if account_type in ['Accounts Receivable', 'Cash', 'Inventory'] and current_balance < 0:
+            if account_type in _NO_NEGATIVE_TYPES and current_balance < 0:
                 adjustment = {
-                    'account_name': account_name,
+                    'account_name': account.get('Name', ''),
                     'original_amount': current_balance,
                     'adjusted_amount': abs(current_balance),
                     'adjustment_amount': abs(current_balance) * 2,
@@ -725,7 +1108,24 @@ class BalanceSheetReconciler:
                 self.adjustments.append(adjustment)
     
     def _generate_summary_balance_sheet(self, balance_sheet):
-        """Generate summary balance sheet from QuickBooks data"""
+        """Generate summary balance sheet from QuickBooks data, memoized on the payload content"""
+        key = _payload_digest(balance_sheet)
+        with _summary_cache_lock:
+            summary = _summary_cache.get(key)
+            if summary is not None:
+                _summary_cache.move_to_end(key)
+                return copy.deepcopy(summary)
+        
+        summary = self._build_summary_balance_sheet(balance_sheet)
+        
+        with _summary_cache_lock:
+            _summary_cache[key] = summary
+            if len(_summary_cache) > SUMMARY_CACHE_SIZE:
+                _summary_cache.popitem(last=False)
+        return copy.deepcopy(summary)
+    
+    def _build_summary_balance_sheet(self, balance_sheet):
+        """Walk the QuickBooks balance sheet report and bucket the section totals"""
         if 'Rows' not in balance_sheet:
             return {}
         
@@ -739,29 +1139,11 @@ class BalanceSheetReconciler:
             if 'Rows' in row:
                 for sub_row in row['Rows']:
                     if 'ColData' in sub_row and len(sub_row['ColData']) > 1:
-                        account_name = sub_row.get('group', '')
-                        total_value = float(sub_row['ColData'][-1].get('value', 0))
-                        
-                        # Categorize accounts
-                        if 'ASSET' in account_name.upper():
-                            if 'CURRENT' in account_name.upper():
-                                summary['assets']['current'] = total_value
-                            elif 'FIXED' in account_name.upper() or 'PROPERTY' in account_name.upper():
-                                summary['assets']['fixed'] = total_value
-                            else:
-                                summary['assets']['other'] = total_value
-                        
-                        elif 'LIABILITY' in account_name.upper():
-                            if 'CURRENT' in account_name.upper():
-                                summary['liabilities']['current'] = total_value
-                            else:
-                                summary['liabilities']['long_term'] = total_value
-                        
-                        elif 'EQUITY' in account_name.upper():
-                            if 'RETAINED' in account_name.upper():
-                                summary['equity']['retained_earnings'] = total_value
-                            else:
-                                summary['equity']['owners_equity'] = total_value
+                        # Categorize accounts; only categorized rows need their value parsed
+                        category = _classify_summary_section(sub_row.get('group', ''))
+                        if category:
+                            section, bucket = category
+                            summary[section][bucket] = float(sub_row['ColData'][-1].get('value') or 0)
         
         # Calculate totals
         summary['total_assets'] = summary['assets']['current'] + summary['assets']['fixed'] + summary['assets']['other']
@@ -770,90 +1152,185 @@ class BalanceSheetReconciler:
         
         return summary
 
+# index.html has no per-request context, so it is rendered once and reused
+_index_html = None
+
 @app.route('/')
 def index():
-    return render_template('index.html')
+    global _index_html
+    if app.jinja_env.auto_reload:  # debug/dev: pick up template edits
+        return render_template('index.html')
+    if _index_html is None:
+        _index_html = render_template('index.html')
+    return _index_html
+
+def _balance_sheet_bucket(account_type, subcategory):
+    """Map an account's type/subcategory to its (section, subsection) on the balance sheet"""
+    if account_type == 'equity':
+        return ('equity', None)
+    return (account_type, 'current' if subcategory == 'current' else 'non_current')
+
+def _table_version(model):
+    """ETag for a table's contents, from its change counter in table_versions"""
+    version = db.session.query(TableVersion.version).filter(
+        TableVersion.table_name == model.__tablename__
+    ).scalar()
+    return f'{model.__tablename__}-{version}' if version is not None else None
+
+def _not_modified(etag):
+    """Whether the client already holds the representation tagged etag"""
+    return etag is not None and etag in request.if_none_match
+
+def _conditional(response, etag):
+    """Tag a response with an ETag, turning it into a 304 if the client's copy is current"""
+    if etag is None:  # table not versioned yet (init_db not run)
+        return response
+    response.set_etag(etag)
+    return response.make_conditional(request)
 
 @app.route('/api/balance-sheet')
 def get_balance_sheet():
-    accounts = Account.query.all()
+    snapshot_id = request.args.get('snapshot_id', type=int)
+    
+    # A stored snapshot already carries its totals, so serve them directly
+    if snapshot_id is not None:
+        snapshot = db.session.query(
+            BalanceSheetSnapshot.id,
+            BalanceSheetSnapshot.created_at,
+            BalanceSheetSnapshot.date,
+            BalanceSheetSnapshot.current_assets,
+            BalanceSheetSnapshot.non_current_assets,
+            BalanceSheetSnapshot.total_assets,
+            BalanceSheetSnapshot.current_liabilities,
+            BalanceSheetSnapshot.non_current_liabilities,
+            BalanceSheetSnapshot.total_liabilities,
+            BalanceSheetSnapshot.total_equity
+        ).filter(BalanceSheetSnapshot.id == snapshot_id).first()
+        if not snapshot:
+            return jsonify({'error': 'Snapshot not found'}), 404
+        
+        # Snapshots are immutable; created_at keeps a reused id from matching an old tag
+        created = snapshot.created_at.strftime('%Y%m%dT%H%M%S') if snapshot.created_at else '0'
+        etag = f'snapshot-{snapshot.id}-{created}'
+        if _not_modified(etag):
+            return _conditional(app.response_class(), etag)
+        
+        return _conditional(jsonify({
+            'snapshot_id': snapshot.id,
+            'date': snapshot.date,
+            'totals': {
+                'current_assets': snapshot.current_assets,
+                'non_current_assets': snapshot.non_current_assets,
+                'total_assets': snapshot.total_assets,
+                'current_liabilities': snapshot.current_liabilities,
+                'non_current_liabilities': snapshot.non_current_liabilities,
+                'total_liabilities': snapshot.total_liabilities,
+                'total_equity': snapshot.total_equity
+            }
+        }), etag)
+    
+    # Unchanged data is answered with a 304 before running the aggregation or serialization
+    etag = _table_version(Account)
+    if _not_modified(etag):
+        return _conditional(app.response_class(), etag)
+    
+    # Totals are aggregated by the database in a single grouped query
+    sums = defaultdict(float)
+    for account_type, subcategory, total in db.session.query(
+        Account.account_type, Account.subcategory, func.sum(Account.balance)
+    ).group_by(Account.account_type, Account.subcategory):
+        sums[_balance_sheet_bucket(account_type, subcategory)] += total or 0.0
+    
+    # Listing query fetches only the columns the dashboard shows, as plain rows
+    accounts = defaultdict(list)
+    for account_id, name, balance, status, description, account_type, subcategory in db.session.query(
+        Account.id, Account.name, Account.balance, Account.status, Account.description,
+        Account.account_type, Account.subcategory
+    ).order_by(Account.id):
+        accounts[_balance_sheet_bucket(account_type, subcategory)].append({
+            'id': account_id,
+            'name': name,
+            'balance': balance,
+            'status': status,
+            'description': description
+        })
     
     # Organize accounts by type and subcategory
     balance_sheet = {
         'assets': {
-            'current': [],
-            'non_current': []
+            'current': accounts[('asset', 'current')],
+            'non_current': accounts[('asset', 'non_current')]
         },
         'liabilities': {
-            'current': [],
-            'non_current': []
+            'current': accounts[('liability', 'current')],
+            'non_current': accounts[('liability', 'non_current')]
         },
-        'equity': []
+        'equity': accounts[('equity', None)]
     }
     
-    for account in accounts:
-        account_data = {
-            'id': account.id,
-            'name': account.name,
-            'balance': account.balance,
-            'status': account.status,
-            'description': account.description
-        }
-        
-        if account.account_type == 'asset':
-            if account.subcategory == 'current':
-                balance_sheet['assets']['current'].append(account_data)
-            else:
-                balance_sheet['assets']['non_current'].append(account_data)
-        elif account.account_type == 'liability':
-            if account.subcategory == 'current':
-                balance_sheet['liabilities']['current'].append(account_data)
-            else:
-                balance_sheet['liabilities']['non_current'].append(account_data)
-        elif account.account_type == 'equity':
-            balance_sheet['equity'].append(account_data)
-    
-    # Calculate totals
-    total_current_assets = sum(a['balance'] for a in balance_sheet['assets']['current'])
-    total_non_current_assets = sum(a['balance'] for a in balance_sheet['assets']['non_current'])
-    total_assets = total_current_assets + total_non_current_assets
-    
-    total_current_liabilities = sum(a['balance'] for a in balance_sheet['liabilities']['current'])
-    total_non_current_liabilities = sum(a['balance'] for a in balance_sheet['liabilities']['non_current'])
-    total_liabilities = total_current_liabilities + total_non_current_liabilities
-    
-    total_equity = sum(a['balance'] for a in balance_sheet['equity'])
+    total_current_assets = sums[('asset', 'current')]
+    total_non_current_assets = sums[('asset', 'non_current')]
+    total_current_liabilities = sums[('liability', 'current')]
+    total_non_current_liabilities = sums[('liability', 'non_current')]
     
-    return jsonify({
+    return _conditional(jsonify({
         'accounts': balance_sheet,
         'totals': {
             'current_assets': total_current_assets,
             'non_current_assets': total_non_current_assets,
-            'total_assets': total_assets,
+            'total_assets': total_current_assets + total_non_current_assets,
             'current_liabilities': total_current_liabilities,
             'non_current_liabilities': total_non_current_liabilities,
-            'total_liabilities': total_liabilities,
-            'total_equity': total_equity
+            'total_liabilities': total_current_liabilities + total_non_current_liabilities,
+            'total_equity': sums[('equity', None)]
         }
-    })
+    }), etag)
 
 @app.route('/api/reconciliation-notes')
 def get_reconciliation_notes():
-    notes = ReconciliationNote.query.order_by(ReconciliationNote.created_at.desc()).all()
-    
-    notes_data = []
-    for note in notes:
-        notes_data.append({
-            'id': note.id,
-            'title': note.title,
-            'description': note.description,
-            'amount': note.amount,
-            'note_type': note.note_type,
-            'status': note.status,
-            'created_at': note.created_at.isoformat()
-        })
+    etag = _table_version(ReconciliationNote)
+    if _not_modified(etag):
+        return _conditional(app.response_class(), etag)
+    
+    # Plain row tuples; no ORM instances or identity-map bookkeeping per note
+    notes = ReconciliationNote.query.with_entities(
+        ReconciliationNote.id,
+        ReconciliationNote.title,
+        ReconciliationNote.description,
+        ReconciliationNote.amount,
+        ReconciliationNote.note_type,
+        ReconciliationNote.status,
+        ReconciliationNote.created_at
+    ).order_by(ReconciliationNote.created_at.desc(), ReconciliationNote.id.desc()).all()
+    
+    notes_data = [{
+        'id': note.id,
+        'title': note.title,
+        'description': note.description,
+        'amount': note.amount,
+        'note_type': note.note_type,
+        'status': note.status,
+        'created_at': note.created_at
+    } for note in notes]
+    
+    return _conditional(jsonify(notes_data), etag)
+
+@app.route('/api/snapshot-summary')
+def get_snapshot_summary():
+    """Latest snapshot totals and snapshot count, read from the summary row"""
+    summary = db.session.get(SnapshotSummary, 1)
+    if not summary:
+        return jsonify({'snapshot_count': 0})
     
-    return jsonify(notes_data)
+    return jsonify({
+        'snapshot_count': summary.snapshot_count,
+        'last_snapshot_id': summary.last_snapshot_id,
+        'last_date': summary.last_date,
+        'last_total_assets': summary.last_total_assets,
+        'last_total_liabilities': summary.last_total_liabilities,
+        'last_total_equity': summary.last_total_equity,
+        'last_is_balanced': summary.last_is_balanced
+    })
 
 @app.route('/api/accounts', methods=['POST'])
 def create_account():
@@ -902,32 +1379,65 @@ def create_reconciliation_note():
     )
     
 
+EXPORT_SPOOL_MAX_SIZE = 1 << 20  # bytes of a generated export kept in memory before spilling to disk
+
+# Export context cache: the PDF and Excel exports of a report are usually
+# requested seconds apart, so both reuse one load of the snapshot and adjustments
+_export_cache = TTLCache(maxsize=32, ttl=60)
+_export_cache_lock = threading.Lock()
+
+# Cached entries outlive the request session and are shared across threads,
+# so they hold plain tuples rather than ORM instances
+_ExportSnapshot = namedtuple('_ExportSnapshot', 'id date total_assets total_liabilities total_equity is_balanced')
+_ExportAdjustment = namedtuple('_ExportAdjustment',
+                               'account_name original_amount adjusted_amount adjustment_amount reason adjustment_type')
+
+@cached(_export_cache, lock=_export_cache_lock)
+def _load_export_context(snapshot_id):
+    """Return (snapshot, adjustments) rows for an export, loaded in a single joined query"""
+    snapshot = BalanceSheetSnapshot.query.options(
+        joinedload(BalanceSheetSnapshot.adjustments)
+    ).filter(BalanceSheetSnapshot.id == snapshot_id).one()
+    
+    adjustments = [
+        _ExportAdjustment(adj.account_name, adj.original_amount, adj.adjusted_amount,
+                          adj.adjustment_amount, adj.reason, adj.adjustment_type)
+        for adj in snapshot.adjustments
+    ]
+    return _ExportSnapshot(snapshot.id, snapshot.date, snapshot.total_assets, snapshot.total_liabilities,
+                           snapshot.total_equity, snapshot.is_balanced), adjustments
+
+def invalidate_export_cache():
+    """Forget all cached export contexts"""
+    with _export_cache_lock:
+        _export_cache.clear()
+
 @app.route('/api/export/pdf')
 def export_pdf():
     """Export balance sheet as PDF"""
     try:
         # Get latest reconciliation log
-        latest_log = BalanceSheetSnapshot.query.order_by(BalanceSheetSnapshot.created_at.desc()).first()
-        if not latest_log:
+        latest_id = db.session.query(BalanceSheetSnapshot.id).order_by(BalanceSheetSnapshot.created_at.desc(), BalanceSheetSnapshot.id.desc()).limit(1).scalar()
+        if latest_id is None:
             return jsonify({'error': 'No balance sheet data found. Generate report first.'}), 400
         
-        AuditLog.log_action('PDF_EXPORTED', f'PDF exported for balance sheet dated {latest_log.date}')
+        # Snapshot and its adjustments, shared with the other exporter via a short-lived cache
+        latest_log, adjustments = _load_export_context(latest_id)
+        date_compact = latest_log.date.strftime('%Y%m%d')
+        date_long = latest_log.date.strftime('%B %d, %Y')
         
-        # Get adjustments for this report
-        adjustments = Adjustment.query.filter_by(reconciliation_log_id=latest_log.id).all()
+        AuditLog.log_action('PDF_EXPORTED', f'PDF exported for balance sheet dated {latest_log.date}')
         
-        # Generate PDF
-        buffer = io.BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=A4)
-        styles = getSampleStyleSheet()
+        # Generate PDF; small reports stay in memory, large ones spill to disk
+        buffer = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_MAX_SIZE)
+        doc = SimpleDocTemplate(buffer, pagesize=A4, leftMargin=0.5*inch, rightMargin=0.5*inch,
+                                topMargin=0.5*inch, bottomMargin=0.5*inch)
         
         content = []
         
         # Title
-        title_style = ParagraphStyle('CustomTitle', parent=styles['Heading1'], 
-                                  fontSize=18, spaceAfter=30, alignment=1)
-        content.append(Paragraph("Balance Sheet", title_style))
-        content.append(Paragraph(f"As of {latest_log.date.strftime('%B %d, %Y')}", styles['Normal']))
+        content.append(Paragraph("Balance Sheet", _PDF_TITLE_STYLE))
+        content.append(Paragraph(f"As of {date_long}", _PDF_STYLES['Normal']))
         content.append(Spacer(1, 20))
         
         # Balance Sheet Summary
@@ -938,36 +1448,50 @@ def export_pdf():
         data.append(['', ''])
         data.append(['Balanced', 'YES' if latest_log.is_balanced else 'NO'])
         
-        table = Table(data, colWidths=[4*inch, 2*inch])
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black)
-        ]))
+        table = Table(data, colWidths=[4*inch, 2*inch], repeatRows=1)
+        table.setStyle(_BS_TABLE_STYLE)
         
         content.append(table)
         
         if adjustments:
             content.append(Spacer(1, 20))
-            content.append(Paragraph("Adjustment Notes", styles['Heading2']))
+            content.append(Paragraph("Adjustment Notes", _PDF_STYLES['Heading2']))
             
+            # One table per adjustment type keeps reportlab's layout cost bounded by
+            # the section size instead of the whole report
+            adjustments_by_type = {}
             for adj in adjustments:
-                content.append(Paragraph(f"{adj.account_name}: {adj.reason}", styles['Normal']))
-                content.append(Paragraph(f"Adjustment: ${adj.adjustment_amount:,.2f}", styles['Normal']))
+                adjustments_by_type.setdefault(adj.adjustment_type, []).append(adj)
+            
+            for adjustment_type, type_adjustments in adjustments_by_type.items():
+                content.append(Paragraph(escape(adjustment_type.replace('_', ' ').title()), _PDF_STYLES['Heading3']))
+                
+                adj_data = [['Account', 'Original', 'Adjustment', 'Reason']]
+                for adj in type_adjustments:
+                    adj_data.append([
+                        Paragraph(escape(adj.account_name), _CELL_STYLE),
+                        f"${adj.original_amount:,.2f}",
+                        f"${adj.adjustment_amount:,.2f}",
+                        Paragraph(escape(adj.reason), _CELL_STYLE)
+                    ])
+                
+                adj_table = Table(adj_data, colWidths=_ADJUSTMENT_COL_WIDTHS, repeatRows=1, splitByRow=1)
+                adj_table.setStyle(_ADJUSTMENT_TABLE_STYLE)
+                content.append(adj_table)
                 content.append(Spacer(1, 10))
         
         doc.build(content)
+        size = buffer.seek(0, io.SEEK_END)
         buffer.seek(0)
         
-        return send_file(
+        response = send_file(
             buffer,
             as_attachment=True,
-            download_name=f'balance_sheet_{latest_log.date.strftime("%Y%m%d")}.pdf',
+            download_name=f'balance_sheet_{date_compact}.pdf',
             mimetype='application/pdf'
         )
+        response.content_length = size
+        return response
         
     except Exception as e:
         logger.error(f"Error exporting PDF: {e}")
@@ -978,60 +1502,150 @@ def export_excel():
     """Export balance sheet as Excel"""
     try:
         # Get latest reconciliation log
-        latest_log = BalanceSheetSnapshot.query.order_by(BalanceSheetSnapshot.created_at.desc()).first()
-        if not latest_log:
+        latest_id = db.session.query(BalanceSheetSnapshot.id).order_by(BalanceSheetSnapshot.created_at.desc(), BalanceSheetSnapshot.id.desc()).limit(1).scalar()
+        if latest_id is None:
             return jsonify({'error': 'No balance sheet data found. Generate report first.'}), 400
         
+        # Snapshot and its adjustments, shared with the other exporter via a short-lived cache
+        latest_log, adjustments = _load_export_context(latest_id)
+        date_compact = latest_log.date.strftime('%Y%m%d')
+        
         AuditLog.log_action('EXCEL_EXPORTED', f'Excel exported for balance sheet dated {latest_log.date}')
         
-        # Get adjustments for this report
-        adjustments = Adjustment.query.filter_by(reconciliation_log_id=latest_log.id).all()
+        # Create Excel workbook; small reports stay in memory, large ones spill to disk
+        buffer = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_MAX_SIZE)
         
-        # Create Excel workbook
-        buffer = io.BytesIO()
+        workbook = xlsxwriter.Workbook(buffer, {'in_memory': True})
+        header_format = workbook.add_format({'bold': True, 'border': 1})
         
-        with pd.ExcelWriter(buffer, engine='xlsxwriter') as writer:
-            # Balance Sheet Summary
-            bs_data = {
-                'Category': ['Total Assets', 'Total Liabilities', 'Total Equity', 'Balanced'],
-                'Amount': [latest_log.total_assets, latest_log.total_liabilities, 
-                          latest_log.total_equity, 'YES' if latest_log.is_balanced else 'NO']
-            }
-            df_bs = pd.DataFrame(bs_data)
-            df_bs.to_excel(writer, sheet_name='Balance Sheet', index=False)
-            
-            # Adjustment Notes
-            if adjustments:
-                adj_data = []
-                for adj in adjustments:
-                    adj_data.append({
-                        'Account': adj.account_name,
-                        'Original Amount': adj.original_amount,
-                        'Adjusted Amount': adj.adjusted_amount,
-                        'Adjustment': adj.adjustment_amount,
-                        'Reason': adj.reason,
-                        'Type': adj.adjustment_type
-                    })
-                df_adj = pd.DataFrame(adj_data)
-                df_adj.to_excel(writer, sheet_name='Adjustment Notes', index=False)
+        # Balance Sheet Summary
+        ws_bs = workbook.add_worksheet('Balance Sheet')
+        ws_bs.write_row(0, 0, ['Category', 'Amount'], header_format)
+        ws_bs.write_column(1, 0, ['Total Assets', 'Total Liabilities', 'Total Equity', 'Balanced'])
+        ws_bs.write_column(1, 1, [latest_log.total_assets, latest_log.total_liabilities,
+                                  latest_log.total_equity, 'YES' if latest_log.is_balanced else 'NO'])
+        
+        # Adjustment Notes
+        if adjustments:
+            ws_adj = workbook.add_worksheet('Adjustment Notes')
+            ws_adj.write_row(0, 0, ['Account', 'Original Amount', 'Adjusted Amount', 'Adjustment', 'Reason', 'Type'],
+                             header_format)
+            for row_num, adj in enumerate(adjustments, start=1):
+                ws_adj.write_row(row_num, 0, [adj.account_name, adj.original_amount, adj.adjusted_amount,
+                                              adj.adjustment_amount, adj.reason, adj.adjustment_type])
+        
+        workbook.close()
         
+        size = buffer.seek(0, io.SEEK_END)
         buffer.seek(0)
         
-        return send_file(
+        response = send_file(
             buffer,
             as_attachment=True,
-            download_name=f'balance_sheet_{latest_log.date.strftime("%Y%m%d")}.xlsx',
+            download_name=f'balance_sheet_{date_compact}.xlsx',
             mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
         )
+        response.content_length = size
+        return response
         
     except Exception as e:
         logger.error(f"Error exporting Excel: {e}")
         return jsonify({'error': f'Error exporting Excel: {str(e)}'}), 500
 
+def _ensure_indexes():
+    """Create model indexes missing from databases built before they were declared"""
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            try:
+                index.create(db.engine, checkfirst=True)
+            except exc.OperationalError as e:
+                logger.warning(f"Could not create index {index.name}: {e}")
+
+def _ensure_columns():
+    """Add model columns missing from databases built before they were declared.
+    
+    Existing rows get NULL in the new columns.
+    """
+    inspector = db.inspect(db.engine)
+    with db.engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                column_type = column.type.compile(dialect=db.engine.dialect)
+                conn.exec_driver_sql(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}')
+                logger.info(f"Added column {table.name}.{column.name}")
+
+# Tables whose API responses carry an ETag built from their change counter
+VERSIONED_TABLES = ('accounts', 'reconciliation_notes')
+
+def _ensure_version_triggers():
+    """Seed table_versions and install the triggers that bump it on every write.
+    
+    Counters start at the current epoch second so a re-created database never
+    hands out an ETag issued for an earlier one.
+    """
+    with db.engine.begin() as conn:
+        for table in VERSIONED_TABLES:
+            conn.execute(
+                sqlite_insert(TableVersion).values(table_name=table, version=int(time.time()))
+                .on_conflict_do_nothing(index_elements=['table_name'])
+            )
+            for operation in ('INSERT', 'UPDATE', 'DELETE'):
+                conn.exec_driver_sql(
+                    f"CREATE TRIGGER IF NOT EXISTS trg_{table}_version_{operation.lower()} "
+                    f"AFTER {operation} ON {table} BEGIN "
+                    f"UPDATE table_versions SET version = version + 1 WHERE table_name = '{table}'; "
+                    f"END"
+                )
+
+def _seed_snapshot_summary():
+    """Build the summary row from existing snapshots if the database predates it"""
+    if db.session.get(SnapshotSummary, 1) is not None:
+        return
+    
+    snapshot_count = db.session.query(func.count(BalanceSheetSnapshot.id)).scalar()
+    if not snapshot_count:
+        return
+    
+    latest = BalanceSheetSnapshot.query.order_by(
+        BalanceSheetSnapshot.created_at.desc(), BalanceSheetSnapshot.id.desc()
+    ).first()
+    db.session.execute(sqlite_insert(SnapshotSummary).values(
+        id=1,
+        snapshot_count=snapshot_count,
+        last_snapshot_id=latest.id,
+        last_date=latest.date,
+        last_total_assets=latest.total_assets,
+        last_total_liabilities=latest.total_liabilities,
+        last_total_equity=latest.total_equity,
+        last_is_balanced=latest.is_balanced
+    ).on_conflict_do_nothing(index_elements=['id']))
+    db.session.commit()
+
+def _ensure_incremental_vacuum():
+    """Switch a database created without auto-vacuum to incremental mode.
+    
+    PRAGMA auto_vacuum only applies to a new database file; an existing one
+    needs a one-time VACUUM to rebuild it in the new mode.
+    """
+    with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        if conn.exec_driver_sql('PRAGMA auto_vacuum').scalar() != 0:
+            return
+        logger.info("Rebuilding database with incremental auto-vacuum")
+        conn.exec_driver_sql('PRAGMA auto_vacuum=INCREMENTAL')
+        conn.exec_driver_sql('VACUUM')
+
 def init_db():
     """Initialize database"""
     with app.app_context():
+        _ensure_incremental_vacuum()
         db.create_all()
+        _ensure_columns()
+        _ensure_indexes()
+        _ensure_version_triggers()
+        _seed_snapshot_summary()
         
         # Check if data already exists
         if Account.query.first() is None:
@@ -1061,10 +1675,6 @@ def init_db():
                 {'name': 'Current Period Net Income', 'account_type': 'equity', 'subcategory': None, 'balance': 186450, 'status': 'adjusted'}
             ]
             
-            for account_data in sample_accounts:
-                account = Account(**account_data)
-                db.session.add(account)
-            
             # Sample reconciliation notes
             sample_notes = [
                 {
@@ -1097,12 +1707,22 @@ def init_db():
                 }
             ]
             
-            for note_data in sample_notes:
-                note = ReconciliationNote(**note_data)
-                db.session.add(note)
-            
+            db.session.bulk_insert_mappings(Account, sample_accounts)
+            db.session.bulk_insert_mappings(ReconciliationNote, sample_notes)
             db.session.commit()
 
+@app.cli.command('db-maintenance')
+def db_maintenance():
+    """Reclaim free pages left behind by deletes (run periodically, e.g. from cron)"""
+    # Each step of the pragma frees one page. The statement returns no columns,
+    # so execute() stops after the first step; executescript() runs it to completion
+    dbapi_conn = db.engine.raw_connection()
+    try:
+        dbapi_conn.executescript('PRAGMA incremental_vacuum(100);')
+    finally:
+        dbapi_conn.close()
+    logger.info("Database maintenance completed")
+
 # Mock QuickBooks Routes (without authlib)
 @app.route('/connect/qbo')
 def connect_qbo():
@@ -1130,7 +1750,7 @@ def generate_balance_sheet():
         as_of_date_str = request.form.get('as_of_date')
         as_of_date = None
         if as_of_date_str:
-            as_of_date = datetime.strptime(as_of_date_str, '%Y-%m-%d').date()
+            as_of_date = date.fromisoformat(as_of_date_str)
         
         # Generate impressive demo data
         demo_data = generate_demo_balance_sheet_data(as_of_date)